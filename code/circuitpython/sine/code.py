@@ -6,6 +6,7 @@ import pwmio
 import digitalio
 import time
 import math
+import array
 
 # PWM setup for each phase - both high and low side
 # Adjust pins according to your board
@@ -19,54 +20,123 @@ pwm_cl = pwmio.PWMOut(board.D12, frequency=20000, duty_cycle=0)
 # Constants
 PWM_MAX = 65535  # 16-bit PWM
 DEAD_TIME = 0.000001  # 1 microsecond dead time
-PHASE_OFFSET = 2 * math.pi / 3.0  # 120 degrees of each other
-DEGREE_TO_RADIAN_MULTIPLIER = math.pi / 180
+
+# The lookup table divides one full cycle into TABLE_SIZE slots.
+# This is a power of two so that wrapping a slot index is a single bit mask.
+TABLE_SIZE = 1024
+TABLE_MASK = TABLE_SIZE - 1
+SLOT_TO_RADIAN_MULTIPLIER = 2 * math.pi / TABLE_SIZE
+SLOT_TO_DEGREE_MULTIPLIER = 360 / TABLE_SIZE
+QUARTER_SIZE = TABLE_SIZE // 4  # 90 degrees, in slots
+
+# A cosine wave is symmetric, so building the tables only calculates its first
+# quarter and mirrors and/or negates it for the rest. This doesn't change the size
+# of the tables kept in RAM, but cuts the trig calls at import from 2048 to 257,
+# which are slow with the software floating point of many boards.
+QUARTER_SIGNS = (1, -1, -1, 1)
+QUARTER_REFLECT = (False, True, False, True)
+
+# While building the tables, the other two phases are derived from the cosine and
+# sine of the first with cos(a -/+ 120 degrees) = cos(120) * cos(a) +/- sin(120) * sin(a).
+# This keeps them exactly 120 degrees apart, which a slot offset can't do with
+# TABLE_SIZE being a power of two. update() itself only does table lookups.
+COS_120 = -0.5
+SIN_120 = math.sqrt(3) / 2
+
+def quarter_cos(quarter_table, idx):
+    """Return the cosine of any slot, from a table of the first quarter of the cycle"""
+    (quarter, offset) = divmod(idx & TABLE_MASK, QUARTER_SIZE)
+    if QUARTER_REFLECT[quarter]:
+        offset = QUARTER_SIZE - offset
+    return quarter_table[offset] * QUARTER_SIGNS[quarter]
+
+def build_pwm_tables():
+    """Return arrays of the signed duty cycles (-PWM_MAX to +PWM_MAX) of each phase, for every slot"""
+    quarter_table = [math.cos(i * SLOT_TO_RADIAN_MULTIPLIER) for i in range(QUARTER_SIZE + 1)]
+
+    # 32-bit, since the duty cycles don't fit into a signed 16-bit int
+    pwm_a = array.array('l')
+    pwm_b = array.array('l')
+    pwm_c = array.array('l')
+    for i in range(TABLE_SIZE):
+        cos_a = quarter_cos(quarter_table, i)
+        sin_a = quarter_cos(quarter_table, i - QUARTER_SIZE)  # sin(a) = cos(a - 90 degrees)
+        pwm_a.append(int(cos_a * PWM_MAX))
+        pwm_b.append(int((COS_120 * cos_a + SIN_120 * sin_a) * PWM_MAX))  # cos(a - 120 degrees)
+        pwm_c.append(int((COS_120 * cos_a - SIN_120 * sin_a) * PWM_MAX))  # cos(a + 120 degrees)
+    return (pwm_a, pwm_b, pwm_c)
+
+# One flat array per phase, so updating the output needs no math at all.
+# This costs 3 x TABLE_SIZE x 4 bytes (~12 KB) of RAM.
+(PWM_A, PWM_B, PWM_C) = build_pwm_tables()
 
 DIRECTION_FORWARDS = 1
 DIRECTION_BACKWARDS = -1
 
 class LinearActuator:
     def __init__(self):
-        self.running = 1
-        self.degrees = 0.0 # Current position, in degrees of a full cycle (0 - 360)
-        self.step_increment =  .5 # How many degrees to increment at each step
+        self.running = True # Binds update(), which is rebound to _noop while stopped
+        self.step_idx = 0 # Current position, in slots of a full cycle (0 - TABLE_SIZE)
+        self.step_increment = 1 # How many slots (360 / TABLE_SIZE degrees each) to increment at each step
         self.direction = DIRECTION_FORWARDS
+        self.debug = False # Print the position at every update (slow over USB serial)
+
+        # Keep the PWM outputs on the instance to avoid global lookups in the hot path
+        self._ah = pwm_ah
+        self._al = pwm_al
+        self._bh = pwm_bh
+        self._bl = pwm_bl
+        self._ch = pwm_ch
+        self._cl = pwm_cl
+        self._phases = ((self._ah, self._al), (self._bh, self._bl), (self._ch, self._cl))
         self.output_off()
 
     def output_off(self):
         """Turn off all output"""
-        pwm_ah.duty_cycle = 0
-        pwm_al.duty_cycle = 0
-        pwm_bh.duty_cycle = 0
-        pwm_bl.duty_cycle = 0
-        pwm_ch.duty_cycle = 0
-        pwm_cl.duty_cycle = 0
-
-    def apply_phase(self, high_pwm, low_pwm, value):
-        """Apply PWM to one phase with dead time"""
-        if value >= 0:
-            # Positive current flow
-            low_pwm.duty_cycle = 0
-            time.sleep(DEAD_TIME)
-            high_pwm.duty_cycle = int(value * PWM_MAX)
-        else:
-            # Negative current flow
-            high_pwm.duty_cycle = 0
+        self._ah.duty_cycle = 0
+        self._al.duty_cycle = 0
+        self._bh.duty_cycle = 0
+        self._bl.duty_cycle = 0
+        self._ch.duty_cycle = 0
+        self._cl.duty_cycle = 0
+        self._driven_side = [None, None, None] # Which side of each H-bridge is driven (False: high, True: low, None: off)
+        self._last_duty = [0, 0, 0] # Duty cycle last written to the driven side of each H-bridge
+
+    def apply_all(self, phase_a, phase_b, phase_c):
+        """Apply signed duty cycles (-PWM_MAX to +PWM_MAX) to all three phases, sharing a single dead time"""
+        values = (phase_a, phase_b, phase_c)
+        driven_side = self._driven_side
+        last_duty = self._last_duty
+        phases = self._phases
+
+        # Turn off the opposing side of any H-bridge that is changing direction.
+        # If the direction hasn't changed, the opposing side is already off.
+        flipped = False
+        for i in range(3):
+            side = values[i] < 0 # Index into (high, low): the low side for negative current
+            if side != driven_side[i]:
+                phases[i][not side].duty_cycle = 0
+                driven_side[i] = side
+                last_duty[i] = 0 # The newly driven side was off
+                flipped = True
+
+        if flipped:
             time.sleep(DEAD_TIME)
-            low_pwm.duty_cycle = int(-value * PWM_MAX)
+
+        # Drive current in the direction of each phase, skipping unchanged outputs
+        for i in range(3):
+            duty = abs(values[i])
+            if duty != last_duty[i]:
+                phases[i][driven_side[i]].duty_cycle = duty
+                last_duty[i] = duty
 
     def step(self, direction):
         """ Adjust angle to step in one direction or the other. (direction: 1 or -1)"""
+        # Masking keeps the angle in range of one cycle, in either direction
         if direction == DIRECTION_FORWARDS:
-            self.degrees += self.step_increment
+            self.step_idx = (self.step_idx + self.step_increment) & TABLE_MASK
         else:
-            self.degrees -= self.step_increment
-
-        # Keep angle in range of one cycle (360 degrees)
-        if self.degrees >= 360:
-            self.degrees -= 360
-        elif self.degrees < 0:
-            self.degrees += 360
+            self.step_idx = (self.step_idx - self.step_increment) & TABLE_MASK
 
     def next_step(self):
         """Set the next step angle"""
@@ -76,34 +146,46 @@ class LinearActuator:
         """Set the next step angle"""
         self.step(-1)
 
-    def update(self):
+    def _noop(self):
+        """Stand-in for update() while the actuator is stopped"""
+        pass
+
+    def _update(self):
         """Update all output phases"""
-        if not self.running:
+        idx = self.step_idx
+        if self.debug:
+            print("Degrees: %f" % (idx * SLOT_TO_DEGREE_MULTIPLIER))
+
+        # Look up phase values and apply to H-bridges
+        self.apply_all(PWM_A[idx], PWM_B[idx], PWM_C[idx])
+
+    @property
+    def running(self):
+        """Whether update() drives the outputs"""
+        return self._running
+
+    @running.setter
+    def running(self, running):
+        # Rebinding update() keeps the hot path from checking running on every call
+        self._running = bool(running)
+        if self._running:
+            self.update = self._update
+        else:
+            self.update = self._noop
             self.output_off()
-            return
-
-        print("Degrees: %f" % (self.degrees))
-
-        # Calculate phase values
-        radians = self.degrees * DEGREE_TO_RADIAN_MULTIPLIER
-        phase_a = math.cos(radians)
-        phase_b = math.cos(radians - PHASE_OFFSET)
-        phase_c = math.cos(radians + PHASE_OFFSET)
-
-        # Apply to H-bridges
-        self.apply_phase(pwm_ah, pwm_al, phase_a)
-        self.apply_phase(pwm_bh, pwm_bl, phase_b)
-        self.apply_phase(pwm_ch, pwm_cl, phase_c)
-
 
     def start(self):
         """Start the actuator"""
         self.running = True
 
     def stop(self):
-        """Stop the actuator"""
+        """Stop the actuator and turn off all output.
+
+        An update() method looked up before this call (e.g. `_update = actuator.update`) is
+        still the running version, and calling it will turn the coils back on.
+        Look it up again after start() or stop().
+        """
         self.running = False
-        self.output_off()
 
 # Example usage
 if __name__ == "__main__":
@@ -113,19 +195,24 @@ if __name__ == "__main__":
     try:
         actuator.start()
         actuator.update()
-        full_cycle = 360 / actuator.step_increment
+        full_cycle = TABLE_SIZE / actuator.step_increment
         target_cycle =  round(full_cycle * 1.5)
 
+        # Bind the loop calls to locals, to skip attribute lookups on every iteration
+        _step = actuator.step
+        _update = actuator.update
+        _sleep = time.sleep
+
         while True:
-            actuator.step(direction)
-            actuator.update()
+            _step(direction)
+            _update()
             steps += 1
 
             if steps % target_cycle == 0:
                 direction *= -1
 
             # Small delay to control update rate
-            time.sleep(.0001)
+            _sleep(.0001)
 
     except Exception as e:
         print(f"Error: {e}")
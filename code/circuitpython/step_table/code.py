@@ -5,7 +5,7 @@ import board
 import pwmio
 import digitalio
 import time
-import math
+import array
 
 # PWM setup for each phase - both high and low side
 # Adjust pins according to your board
@@ -53,127 +53,192 @@ STEPS = [
 ]
 NUM_STEPS = len(STEPS)
 
+def scale_phase(phase):
+    """Return one phase of STEPS as an array of signed PWM duty cycles (-PWM_MAX to +PWM_MAX)"""
+    # 32-bit, since the duty cycles don't fit into a signed 16-bit int
+    return array.array('l', [int(row[phase] * PWM_MAX / 100) for row in STEPS])
+
+# STEPS scaled to PWM duty cycles, in one flat array per phase
+STEPS_A = scale_phase(0)
+STEPS_B = scale_phase(1)
+STEPS_C = scale_phase(2)
+
+# Step positions are fixed-point ints. The upper bits are the index into STEPS
+# and the lower STEP_SHIFT bits are the progress towards the next entry.
+STEP_SHIFT = 8
+STEP_SCALE = 1 << STEP_SHIFT
+STEP_MASK = STEP_SCALE - 1
+NUM_SUBSTEPS = NUM_STEPS << STEP_SHIFT
+
+DEBUG_PRINT_INTERVAL = 100 # Minimum number of updates between debug prints
+
+# The step math below only uses ints so that, on MicroPython builds with the
+# native emitter enabled, it can be tagged with @micropython.native/viper.
+# CircuitPython rejects those decorators at compile time, so they're left off.
+def normalize_step(idx, size):
+    """Wrap the step index around, if necessary"""
+    if idx >= size:
+        idx -= size
+    elif idx < 0:
+        idx += size
+    return idx
+
+def interpolate_value(from_value, to_value, progress):
+    """Return an int that is between from_value and to_value by a progress between 0 and STEP_SCALE"""
+    if from_value == to_value:
+        return to_value
+    if progress <= 0:
+        return from_value
+    if progress >= STEP_SCALE:
+        return to_value
+    diff = to_value - from_value
+    return from_value + ((diff * progress) >> STEP_SHIFT)
+
 class LinearActuator:
     def __init__(self):
-        self.running = 1
-        self.current_step = 1
+        self.running = True # Binds step(), which is rebound to _noop while stopped
+        self.current_step = STEP_SCALE # Fixed-point position in STEPS (see STEP_SHIFT)
         self.last_step = -1
-        self.step_increment = .1 # If the value is 0.1, each step will be divided into 10 steps
+        self.step_increment = STEP_SCALE // 10 # Divide each step into ~10 updates
         self.direction = DIRECTION_FORWARDS
+        self.debug = False # Print full step changes (slow over USB serial)
+        self._print_ctr = 0
+
+        # Keep the PWM outputs on the instance to avoid global lookups in the hot path
+        self._ah = pwm_ah
+        self._al = pwm_al
+        self._bh = pwm_bh
+        self._bl = pwm_bl
+        self._ch = pwm_ch
+        self._cl = pwm_cl
+        self._phases = ((self._ah, self._al), (self._bh, self._bl), (self._ch, self._cl))
         self.output_off()
 
     def output_off(self):
         """Turn off all output"""
-        pwm_ah.duty_cycle = 0
-        pwm_al.duty_cycle = 0
-        pwm_bh.duty_cycle = 0
-        pwm_bl.duty_cycle = 0
-        pwm_ch.duty_cycle = 0
-        pwm_cl.duty_cycle = 0
-
-    def apply_phase(self, high_pwm, low_pwm, value):
-        """Apply PWM to one phase with dead time"""
-        multiplier = (value / 100)
-        if value >= 0:
-            # Positive current flow
-            low_pwm.duty_cycle = 0
-            time.sleep(DEAD_TIME)
-            high_pwm.duty_cycle = int(multiplier * PWM_MAX)
-        else:
-            # Negative current flow
-            high_pwm.duty_cycle = 0
+        self._ah.duty_cycle = 0
+        self._al.duty_cycle = 0
+        self._bh.duty_cycle = 0
+        self._bl.duty_cycle = 0
+        self._ch.duty_cycle = 0
+        self._cl.duty_cycle = 0
+        self._driven_side = [None, None, None] # Which side of each H-bridge is driven (False: high, True: low, None: off)
+        self._last_duty = [0, 0, 0] # Duty cycle last written to the driven side of each H-bridge
+
+    def apply_all(self, phase_a, phase_b, phase_c):
+        """Apply signed duty cycles (-PWM_MAX to +PWM_MAX) to all three phases, sharing a single dead time"""
+        values = (phase_a, phase_b, phase_c)
+        driven_side = self._driven_side
+        last_duty = self._last_duty
+        phases = self._phases
+
+        # Turn off the opposing side of any H-bridge that is changing direction.
+        # If the direction hasn't changed, the opposing side is already off.
+        flipped = False
+        for i in range(3):
+            side = values[i] < 0 # Index into (high, low): the low side for negative current
+            if side != driven_side[i]:
+                phases[i][not side].duty_cycle = 0
+                driven_side[i] = side
+                last_duty[i] = 0 # The newly driven side was off
+                flipped = True
+
+        if flipped:
             time.sleep(DEAD_TIME)
-            low_pwm.duty_cycle = int(-1 * multiplier * PWM_MAX)
-
-    def normalize_step(self, idx):
-      """Wrap the step index around, if necessary"""
-      if idx >= NUM_STEPS:
-          idx -= NUM_STEPS
-      elif idx < 0:
-          idx += NUM_STEPS
-      return idx
-
-    def interpolate_value(self, from_value, to_value, percent):
-      """Return a value that is between from_value and to_value by a percentage between 0.0 and 1.0"""
-      if from_value == to_value:
-        return to_value
-      if percent <= 0:
-        return from_value
-      if percent >= 1:
-        return to_value
-      diff = to_value - from_value
-      return (percent * diff) + from_value
 
-    def step(self):
-        """Update all output phases"""
-        if not self.running:
-            self.output_off()
-            return
+        # Drive current in the direction of each phase, skipping unchanged outputs
+        for i in range(3):
+            duty = abs(values[i])
+            if duty != last_duty[i]:
+                phases[i][driven_side[i]].duty_cycle = duty
+                last_duty[i] = duty
+
+    def _noop(self):
+        """Stand-in for step() while the actuator is stopped"""
+        pass
 
+    def _step(self):
+        """Update all output phases"""
         # Increment current step
         self.last_step = self.current_step
         if self.direction == DIRECTION_FORWARDS:
-            self.current_step += self.step_increment
+            current_step = self.current_step + self.step_increment
         else:
-            self.current_step -= self.step_increment
-        self.current_step = self.normalize_step(self.current_step)
+            current_step = self.current_step - self.step_increment
+        current_step = normalize_step(current_step, NUM_SUBSTEPS)
+        self.current_step = current_step
 
-        # Get the percent progress we've made to the next step in the list
-        progress = 0
-        from_idx = int(self.current_step)
-        to_idx = int(self.current_step)
-        if self.direction == DIRECTION_FORWARDS:
-          from_idx = math.floor(self.current_step)
-          to_idx = math.ceil(self.current_step)
-          progress = 1 - (to_idx - self.current_step)
-        else:
-          from_idx = math.ceil(self.current_step)
-          to_idx = math.floor(self.current_step)
-          progress = 1 - (self.current_step - to_idx)
+        # Interpolate between the step we're on and the next one in the list.
+        # This is the same for either direction, since it only depends on position.
+        from_idx = current_step >> STEP_SHIFT
+        to_idx = from_idx + 1
+        progress = current_step & STEP_MASK
 
         # Calculate the phase values
-        to_idx = self.normalize_step(to_idx)
-        from_idx = self.normalize_step(from_idx)
-        (from_a, from_b, from_c) = STEPS[from_idx]
-        (to_a, to_b, to_c) = STEPS[to_idx]
-
-        phase_a = self.interpolate_value(from_a, to_a, progress)
-        phase_b = self.interpolate_value(from_b, to_b, progress)
-        phase_c = self.interpolate_value(from_c, to_c, progress)
-
-        # Only print full step changes
-        if int(self.last_step) != int(self.current_step):
-            print("Step %i (%i, %i, %i)" % (self.current_step, phase_a, phase_b, phase_c))
+        if to_idx == NUM_STEPS:
+            to_idx = 0
+        phase_a = interpolate_value(STEPS_A[from_idx], STEPS_A[to_idx], progress)
+        phase_b = interpolate_value(STEPS_B[from_idx], STEPS_B[to_idx], progress)
+        phase_c = interpolate_value(STEPS_C[from_idx], STEPS_C[to_idx], progress)
+
+        # Only print full step changes, and not too often
+        if self.debug:
+            self._print_ctr += 1
+            if self._print_ctr >= DEBUG_PRINT_INTERVAL and self.last_step >> STEP_SHIFT != from_idx:
+                self._print_ctr = 0
+                print("Step %i (%i, %i, %i)" % (from_idx, phase_a, phase_b, phase_c))
 
         # Apply to H-bridges
-        self.apply_phase(pwm_ah, pwm_al, phase_a)
-        self.apply_phase(pwm_bh, pwm_bl, phase_b)
-        self.apply_phase(pwm_ch, pwm_cl, phase_c)
+        self.apply_all(phase_a, phase_b, phase_c)
+
+    @property
+    def running(self):
+        """Whether step() drives the outputs"""
+        return self._running
+
+    @running.setter
+    def running(self, running):
+        # Rebinding step() keeps the hot path from checking running on every call
+        self._running = bool(running)
+        if self._running:
+            self.step = self._step
+        else:
+            self.step = self._noop
+            self.output_off()
 
     def start(self):
         """Start the actuator"""
         self.running = True
 
     def stop(self):
-        """Stop the actuator"""
+        """Stop the actuator and turn off all output.
+
+        A step() method looked up before this call (e.g. `_step = actuator.step`) is
+        still the running version, and calling it will turn the coils back on.
+        Look it up again after start() or stop().
+        """
         self.running = False
-        self.output_off()
 
 if __name__ == "__main__":
     actuator = LinearActuator()
     actuator.direction = DIRECTION_FORWARDS
     steps = 0
-    target_cycle =  round(NUM_STEPS * (actuator.step_increment * 100)) * 2
+    target_cycle =  round(NUM_SUBSTEPS / actuator.step_increment) * 2
     try:
         actuator.start()
+
+        # Bind the loop calls to locals, to skip attribute lookups on every iteration
+        _step = actuator.step
+        _sleep = time.sleep
+
         while True:
-            actuator.step()
+            _step()
             steps += 1
             if steps % target_cycle == 0:
                 actuator.direction *= -1
 
             # Small delay to control update rate
-            time.sleep(0.001)
+            _sleep(0.001)
     except Exception as e:
         print(f"Error: {e}")
     finally: